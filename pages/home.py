@@ -17,7 +17,8 @@ from streamlit.logger import get_logger
 # Own libraries
 # -------------
 import nixnox.web.dbase as db
-from nixnox.web.streamlit import ttl
+from nixnox.web.streamlit import ttl, instrumented_cache, connection
+from nixnox.web.cache import obs_summary, obs_nsummaries
 from nixnox.lib import ObserverType, PhotometerModel
 
 
@@ -33,22 +34,15 @@ log = get_logger(__name__)
 # ---------------------
 
 
-@st.cache_data(ttl=ttl())
-def obs_summary(_conn, conditions):
-    with _conn.session as session:
-        return db.obs_summary_search(session, conditions)
-
-
-@st.cache_data(ttl=ttl())
-def obs_nsummaries(_conn):
-    with _conn.session as session:
-        return db.obs_nsummaries(session)
+@instrumented_cache(ttl=ttl(), max_entries=64)
+def get_observation_as_ecsv(obs_tag: str) -> bytes:
+    with connection().session as session:
+        return db.obs_export(session, obs_tag)
 
 
-@st.cache_data(ttl=ttl())
-def get_observation_as_ecsv(_conn, obs_tag: str) -> str:
-    with _conn.session as session:
-        return db.obs_export(session, obs_tag)
+def result_table():
+    """The session only keeps the search conditions, results come from the shared cache"""
+    return obs_summary(st.session_state.get("obs_search_conditions"))
 
 
 def selected_obs() -> None:
@@ -58,9 +52,10 @@ def selected_obs() -> None:
             st.session_state.ObservationDF.selection.rows,
         )
         row = st.session_state.ObservationDF.selection.rows[0]
-        log.debug("st.session_state.result_table[row] = %s", st.session_state.result_table[row])
+        table = result_table()
+        log.debug("result_table[row] = %s", table[row])
         # obs_tag is the seccnd item in the row
-        st.session_state.obs_tag = st.session_state.result_table[row][1]
+        st.session_state.obs_tag = table[row][1]
 
 
 def search_database() -> None:
@@ -74,13 +69,12 @@ def search_database() -> None:
         search_conditions["search_by_observer_type"] = ObserverType(
             search_conditions["search_by_observer_type"]
         )
-        result_set = obs_summary(conn, search_conditions)
-        #st.write(result_set)
-        st.session_state.result_table = result_set
+        # Not prefixed by "search_", not to be collected in the next search
+        st.session_state.obs_search_conditions = search_conditions
 
 
 def form(on_submit: Callable) -> None:
-    with st.form("Search", clear_on_submit=True):
+    with st.form("Search", clear_on_submit=False):
         st.write("## Observations finder")
         st.slider("Max. number of results", value=10, min_value=1, max_value=100, key="search_limit")
         with st.expander("Filter by date range"):
@@ -165,21 +159,20 @@ def form(on_submit: Callable) -> None:
         )
 
 
-def header(conn) -> None:
+def header() -> None:
     st.title("**Available observations**")
-    st.write(f"There are {obs_nsummaries(conn)} stored observations available.")
-    if "result_table" not in st.session_state:
+    st.write(f"There are {obs_nsummaries()} stored observations available.")
+    if "obs_search_conditions" not in st.session_state:
         st.write("Displaying a default view of what is available.")
-        st.session_state.result_table = obs_summary(conn, None)
     else:
-        table = st.session_state.result_table
-        N = st.session_state.get("search_limit",10)
+        table = result_table()
+        N = st.session_state.obs_search_conditions["search_limit"]
         st.write(f"Search displaying {len(table)}/{N}.")
 
 def results(resultset):
     #st.write(f"Up to {limit} observations are displayed:")
     st.dataframe(
-        st.session_state.result_table,
+        resultset,
         key="ObservationDF",
         hide_index=True,
         on_select=selected_obs,
@@ -187,7 +180,7 @@ def results(resultset):
     )
     if "obs_tag" in st.session_state:
         obs_tag = st.session_state.obs_tag
-        ecsv = get_observation_as_ecsv(conn, obs_tag)
+        ecsv = get_observation_as_ecsv(obs_tag)
         st.download_button(
             label=f"Download ECSV file: *{obs_tag}*",
             data=ecsv,
@@ -201,7 +194,6 @@ def results(resultset):
 # Start the ball rolling
 # ----------------------
 
-conn = st.connection("env:NX_ENV", type="sql")
-header(conn)
-results(resultset=st.session_state.result_table)
+header()
+results(resultset=result_table())
 form(on_submit=search_database)
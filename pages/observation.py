@@ -15,25 +15,17 @@ import streamlit as st
 
 import pandas as pd
 import nixnox.web.dbase as db
-from nixnox.web.streamlit import ttl
+from nixnox.web.streamlit import ttl, instrumented_cache, connection
+from nixnox.web.cache import get_observation_details
 
 # ============
 # PAGE OBJECTS
 # ============
 
-conn = st.connection("env:NX_ENV", type="sql")
-
-
-@st.cache_data(ttl=ttl())
-def get_observation_details(_conn, obs_tag: str):
-    with _conn.session as session:
-        return db.obs_details(session, obs_tag)
-
-
-@st.cache_data(ttl=ttl())
-def get_measurements(_conn, obs_tag: str):
-    with _conn.session as session:
-        return db.obs_measurements(session, obs_tag)
+@instrumented_cache(ttl=ttl(), max_entries=64)
+def get_measurements(obs_tag: str):
+    with connection().session as session:
+        return db.obs_measurement_rows(session, obs_tag)
 
 
 st.write("## Observation Details")
@@ -41,8 +33,8 @@ if "obs_tag" not in st.session_state:
     st.warning("### Please, select an observation in the home page", icon="⚠️")
 else:
     obs_tag = st.session_state.obs_tag
-    observation, observer, location, photometer = get_observation_details(conn, obs_tag)
-    measurements = get_measurements(conn, obs_tag)
+    observation, observer, location, photometer = get_observation_details(obs_tag)
+    measurements = get_measurements(obs_tag)
 
     c1, c2 = st.columns(2)
     with c1:
@@ -80,4 +72,4 @@ else:
             hide_index=True,
         )
     st.write("## Measurements")
-    st.dataframe([m.to_dict() for m in measurements])
+    st.dataframe(pd.DataFrame(measurements, columns=db.MEASUREMENT_COLUMNS))
@@ -3,7 +3,6 @@
 # ----------------
 
 from io import BytesIO
-from threading import RLock
 
 # ---------
 # STREAMLIT
@@ -14,51 +13,45 @@ import streamlit as st
 # Third party library
 # -------------------
 
-from astropy.table import Table
-
 import nixnox.web.dbase as db
-import nixnox.web.mpl as mpl
-from nixnox.web.streamlit import ttl
+from nixnox.web.streamlit import ttl, instrumented_cache, connection
+from nixnox.web.cache import get_observation_details
 
 # ============
 # PAGE OBJECTS
 # ============
 
-# According to dthe streamlit documebtation:
-# """Matplotlib doesn't work well with threads. 
-#    So if you're using Matplotlib you should wrap your code with locks. 
-#    This Matplotlib bug is more prominent when you deploy and share your apps 
-#    because you're more likely to get concurrent users then.""""
-
-conn = st.connection("env:NX_ENV", type="sql")
-
+@instrumented_cache(ttl=ttl(), max_entries=256)
+def get_measurement_columns(obs_tag: str):
+    with connection().session as session:
+        return db.obs_measurement_columns(session, obs_tag)
 
-@st.cache_data(ttl=ttl())
-def get_observation_details(_conn, obs_tag: str):
-    with _conn.session as session:
-        return db.obs_details(session, obs_tag)
 
+@instrumented_cache(ttl=ttl(), max_entries=64)
+def plot_png(obs_tag: str) -> bytes:
+    """Render the plot once and cache the PNG bytes, not the (large) Figure object.
+    Only the obs_tag is hashed, the plot data is fetched inside on a cache miss"""
+    # Matplotlib & SciPy are only needed when actually rendering
+    import nixnox.web.mpl as mpl
 
-@st.cache_data(ttl=ttl())
-def get_measurements(_conn, obs_tag: str):
-    with _conn.session as session:
-        return db.obs_measurements(session, obs_tag)
-
-
-@st.cache_data(ttl=ttl())
-def plot(
-    obs_tag: str, azimuth, zenital, magnitude, _observation, _observer, _location, _photometer
-):
-    return mpl.plot(
+    observation, observer, location, photometer = get_observation_details(obs_tag)
+    measurements = get_measurement_columns(obs_tag)
+    # mpl.plot() does not touch pyplot, only the actual rendering needs the lock
+    figure = mpl.plot(
         obs_tag,
-        azimuth,
-        zenital,
-        magnitude,
-        observation=_observation,
-        observer=_observer,
-        location=_location,
-        photometer=_photometer,
+        measurements["azimuth"],
+        measurements["zenital"],
+        measurements["magnitude"],
+        observation=observation.to_dict(),
+        observer=observer.to_dict(),
+        location=location.to_dict(),
+        photometer=photometer.to_dict(),
     )
+    output = BytesIO()
+    with mpl.render_lock:
+        # Fast zlib level, the PNG is rendered once and then cached anyway
+        figure.savefig(output, format="png", dpi=100, pil_kwargs={"compress_level": 1})
+    return output.getvalue()
 
 
 st.write("## Night Sky Brightness Plot")
@@ -66,27 +59,12 @@ if "obs_tag" not in st.session_state:
     st.warning("### Please, select an observation in the home page", icon="⚠️")
 else:
     obs_tag = st.session_state.obs_tag
-    observation, observer, location, photometer = get_observation_details(conn, obs_tag)
-    measurements = get_measurements(conn, st.session_state.obs_tag)
-    measurements = Table([m.to_dict() for m in measurements])
-    with RLock():
-        figure = plot(
-            obs_tag,
-            measurements["azimuth"],
-            measurements["zenital"],
-            measurements["magnitude"],
-            observation.to_dict(),
-            observer.to_dict(),
-            location.to_dict(),
-            photometer.to_dict(),
-        )
-        output = BytesIO()
-        figure.savefig(output)
-        st.download_button(
-            label=f"Download Plot: *{obs_tag}*",
-            data=output.getvalue(),
-            file_name=f"{obs_tag}.png",
-            mime="image/png",
-            icon=":material/download:",
-        )
-        st.pyplot(figure)
+    png = plot_png(obs_tag)
+    st.download_button(
+        label=f"Download Plot: *{obs_tag}*",
+        data=png,
+        file_name=f"{obs_tag}.png",
+        mime="image/png",
+        icon=":material/download:",
+    )
+    st.image(png)
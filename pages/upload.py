@@ -15,16 +15,16 @@ import streamlit as st
 # ---------------
 
 import nixnox.lib.ecsv as nx
+from nixnox.web.streamlit import connection
+from nixnox.web.cache import obs_summary, obs_nsummaries
 
 
-# Database connection
-conn = st.connection("env:NX_ENV", type="sql")
 
 st.title("Upload TAS files to database")
 
 data = st.file_uploader("*ECSV File only!*", type=["ecsv"])
 if data:
-    with conn.session as session:
+    with connection().session as session:
         try:
             observation = nx.uploader(session, data)
         except nx.excp.AlreadyExistsError as e:
@@ -34,6 +34,9 @@ if data:
             st.write(e)
             st.error("Error: Invalid file format", icon="🚨")
         else:
+            # Only the cached observation lists & counter are now stale
+            obs_summary.clear()
+            obs_nsummaries.clear()
             st.info(f"Observation upload to database: {observation.identifier}", icon="ℹ️")
             time.sleep(2)
             st.switch_page(os.path.join("pages", "home.py"))
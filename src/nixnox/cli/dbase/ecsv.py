@@ -9,17 +9,18 @@
 # -------------------
 
 import os
-import glob
 import logging
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor
 
 
 # -------------------
 # Third party imports
 # -------------------
 
+from sqlalchemy.orm import Session
+
 from lica.sqlalchemy import sqa_logging
-from lica.sqlalchemy.dbase import Session
 from lica.cli import execute
 
 # --------------
@@ -29,12 +30,8 @@ from lica.cli import execute
 from ... import __version__
 from ..util import parser as prs
 
-from ...lib.ecsv import (
-    uploader,
-    database_import,
-    database_export,
-)
-from ...lib.ecsv.excp import AlreadyExistsError
+# The ECSV library (AstroPy, NumPy, the ORM model, geopy ...) is imported
+# by each CLI function, so that --help or argument errors don't pay for it.
 
 # ----------------
 # Module constants
@@ -55,58 +52,105 @@ log = logging.getLogger(__name__.split(".")[-1])
 # -------------------
 
 
+def _dbimport_paths(session: Session, paths: list[str]) -> None:
+    from ...lib.ecsv import read_ecsv, observation_digests, database_import, excp
+    from ...lib.dbase.model import Observation
+
+    if not paths:
+        return
+    # Parsing is CPU bound and independent for each file, so it is spread among
+    # worker processes. Database writes stay in this process, in file order.
+    with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(read_ecsv, path) for path in paths]
+        # A single transaction (and commit) for all files,
+        # each file is imported within its own SAVEPOINT
+        with session.begin():
+            # Known digests fetched at once, so that new files skip the duplicate lookup
+            cache = {Observation: observation_digests(session)}
+            for path, future in zip(paths, futures):
+                log.info("Loading file %s", path)
+                # A bad file is logged and skipped, not to roll back all the others
+                try:
+                    table = future.result()
+                except Exception as e:
+                    log.error("Can't read file %s: %s", path, e)
+                    continue
+                try:
+                    database_import(session, table, cache)
+                except excp.AlreadyExistsError as e:
+                    log.error(e)
+                except Exception as e:
+                    log.error("Can't import file %s: %s", path, e)
+
+
 # -------------
 # CLI Functions
 # -------------
 
 
 def cli_dbexport_single(session: Session, args: Namespace) -> None:
-    identifier = " ".join(args.identifier)
+    from ...lib.ecsv import database_export
+
     os.makedirs(args.folder, exist_ok=True)
-    database_export(session, args.folder, identifier)
+    database_export(session, args.folder, args.identifier)
 
 
 def cli_dbexport_all(session: Session, args: Namespace) -> None:
+    from ...lib.ecsv import database_export
+
     os.makedirs(args.folder, exist_ok=True)
     database_export(session, args.folder, identifier=None)
 
 
 def cli_dbimport_single(session: Session, args: Namespace) -> None:
-    path = " ".join(args.input_file)
+    from ...lib.ecsv import database_import, excp
+
+    path = args.input_file
     log.info("Loading file %s", path)
-    with open(path, "rb") as file_obj:
-        try:
-            database_import(session, file_obj)
-        except AlreadyExistsError as e:
-            log.error(e)
+    try:
+        database_import(session, path)
+    except excp.AlreadyExistsError as e:
+        log.error(e)
+
+
+def cli_dbimport_many(session: Session, args: Namespace) -> None:
+    _dbimport_paths(session, args.input_file)
 
 
 def cli_dbimport_all(session: Session, args: Namespace) -> None:
-    for path in glob.iglob("*.ecsv", root_dir=args.folder):
-        path = os.path.join(args.folder, path)
-        log.info("Loading file %s", path)
-        with open(path, "rb") as file_obj:
-            try:
-                database_import(session, file_obj)
-            except AlreadyExistsError as e:
-                log.error(e)
+    # scandir() gets the file type along with the names, no stat() per file.
+    # Hidden files are skipped, as glob("*.ecsv") did.
+    with os.scandir(args.folder) as entries:
+        paths = [
+            entry.path
+            for entry in entries
+            if entry.name.endswith(".ecsv") and not entry.name.startswith(".") and entry.is_file()
+        ]
+    _dbimport_paths(session, paths)
 
 
 def cli_obsload_ecsv(session: Session, args: Namespace) -> None:
-    path = " ".join(args.input_file)
+    from ...lib.ecsv import uploader, excp
+
+    path = args.input_file
     log.info("Loading file %s", path)
     with open(path, "rb") as file_obj:
         try:
             uploader(session, file_obj, extra_path=args.text)
-        except AlreadyExistsError as e:
+        except excp.AlreadyExistsError as e:
             log.error(e)
 
+
 def add_dbimport_args(parser: ArgumentParser) -> None:
     subparser = parser.add_subparsers(dest="command", required=True)
     p = subparser.add_parser(
         "observation", parents=[prs.ifile()], help="Import single database ECSV file"
     )
     p.set_defaults(func=cli_dbimport_single)
+    p = subparser.add_parser(
+        "files", parents=[prs.ifiles()], help="Import several database ECSV files"
+    )
+    p.set_defaults(func=cli_dbimport_many)
     p = subparser.add_parser(
         "all", parents=[prs.folder()], help="Export all database observations as ECSV files"
     )
@@ -136,6 +180,9 @@ def add_obsload_args(parser: ArgumentParser) -> None:
 
 
 def cli_main(args: Namespace) -> None:
+    # The engine is created from DATABASE_URL on first import, not needed for --help
+    from lica.sqlalchemy.dbase import Session
+
     sqa_logging(args)
     with Session() as session:
         args.func(session, args)
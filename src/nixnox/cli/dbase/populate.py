@@ -9,15 +9,22 @@
 # -------------------
 
 import logging
-from datetime import datetime, timedelta
+import functools
+from itertools import batched
+from typing import Iterable
+from datetime import datetime
 from argparse import ArgumentParser, Namespace
 
 # -------------------
 # Third party imports
 # -------------------
 
+import numpy as np
+
+from sqlalchemy import insert, event, Engine
+from sqlalchemy.orm import Session, sessionmaker
+
 from lica.sqlalchemy import sqa_logging
-from lica.sqlalchemy.dbase import Session
 from lica.cli import execute
 
 # --------------
@@ -34,6 +41,29 @@ from ...lib.dbase.model import Date, Time, Observer, Location
 
 DESCRIPTION = "NIXNOX Database initial populate tool"
 
+# English names, as strftime() gives in the C locale, indexed by weekday (0 = Monday) & month - 1
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+WEEKDAYS_ABBR = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MONTHS = (
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+)
+MONTHS_ABBR = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# Rows per multi VALUES INSERT statement, as each dialect / driver likes best.
+# SQLite is also bound by its maximum number of host parameters per statement.
+INSERT_PAGE_SIZE = {"sqlite": 500, "postgresql": 10000, "mysql": 1000, "mssql": 500}
+
 # -----------------------
 # Module global variables
 # -----------------------
@@ -42,53 +72,114 @@ DESCRIPTION = "NIXNOX Database initial populate tool"
 # get the root logger
 log = logging.getLogger(__name__.split(".")[-1])
 
+# Write only sessions for the dimension loads: no autoflush and nothing to expire on commit
+BulkSession = sessionmaker(autoflush=False, expire_on_commit=False)
+
 # -------------------
 # Auxiliary functions
 # -------------------
 
 
-def julian_day(date: datetime) -> float:
-    """Returns the Julian day number of a date at 0h UTC."""
-    a = (14 - date.month) // 12
-    y = date.year + 4800 - a
-    m = date.month + 12 * a - 3
-    return (date.day + ((153 * m + 2) // 5) + 365 * y + y // 4 - y // 100 + y // 400 - 32045) - 0.5
+def julian_day(year, month, day):
+    """Julian day number at 0h UTC. Works either on integers or on whole NumPy arrays"""
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    return (day + ((153 * m + 2) // 5) + 365 * y + y // 4 - y // 100 + y // 400 - 32045) - 0.5
+
+
+def date_columns(since: datetime, until: datetime) -> dict[str, list]:
+    """Date dimension columns for every day from since to until, computed on whole
+    NumPy datetime64 arrays instead of one Python datetime per row"""
+    days = np.datetime64(since.date(), "D") + np.arange(max((until - since).days + 1, 0))
+    year = days.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    day = (days - days.astype("datetime64[M]")).astype(np.int64) + 1
+    weekday = (days.astype(np.int64) + 3) % 7  # 0 = Monday, 1970-01-01 was a Thursday
+    sql_date = np.datetime_as_string(days, unit="D").tolist()
+    return dict(
+        date_id=(year * 10000 + month * 100 + day).tolist(),
+        sql_date=sql_date,
+        day=day.tolist(),
+        date=[f"{s[8:10]}/{s[5:7]}/{s[0:4]}" for s in sql_date],
+        day_year=((days - days.astype("datetime64[Y]")).astype(np.int64) + 1).tolist(),
+        julian_day=julian_day(year, month, day).tolist(),
+        weekday=np.array(WEEKDAYS)[weekday].tolist(),
+        weekday_abbr=np.array(WEEKDAYS_ABBR)[weekday].tolist(),
+        weekday_num=((weekday + 1) % 7).tolist(),  # 0 = Sunday
+        month=np.array(MONTHS)[month - 1].tolist(),
+        month_num=month.tolist(),
+        month_abbr=np.array(MONTHS_ABBR)[month - 1].tolist(),
+        year=year.tolist(),
+    )
 
 
-class TimeIterator:
-    def __init__(self, step_seconds=1):
-        self.step = timedelta(seconds=step_seconds)
-        self.current = datetime(
-            year=2000, month=1, day=1, hour=0, minute=0, second=0, microsecond=0
+def bulk_insert(session: Session, model, rows: Iterable[dict], batch_size: int) -> None:
+    """Insert rows in batches of executemany() INSERTs, all within the caller's transaction
+    so that the whole load is committed once. PostgreSQL through psycopg 3 streams them with COPY"""
+    n = 0
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg":
+        columns = [column.name for column in model.__table__.columns]
+        sql = f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN"
+        with session.connection().connection.cursor() as cursor:
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(tuple(row[col] for col in columns))
+                    n += 1
+    else:
+        stmt = insert(model)  # Built once, its compiled form is then cached by the engine
+        for batch in batched(rows, batch_size):
+            session.execute(stmt, batch)
+            n += len(batch)
+            log.debug("Inserted %d %s rows", n, model.__name__)
+    log.info("Inserted %d %s rows", n, model.__name__)
+
+
+def sqlite_bulk_pragmas(dbapi_connection, connection_record) -> None:
+    """Tune every new SQLite connection for bulk loading: WAL journal (no rollback
+    journal fsync per transaction), normal sync, 64 MiB page cache and temp tables in memory"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def time_rows(step_seconds: int = 1) -> Iterable[dict]:
+    """Time dimension rows for a whole day, pure integer arithmetic, no datetime objects"""
+    for s in range(0, 24 * 60 * 60, step_seconds):
+        h, rem = divmod(s, 3600)
+        m, sec = divmod(rem, 60)
+        yield dict(
+            time_id=h * 10000 + m * 100 + sec,
+            time=f"{h:02d}:{m:02d}:{sec:02d}",
+            hour=h,
+            minute=m,
+            second=sec,
+            day_fraction=s / (24 * 60 * 60),
         )
-        self.limit = datetime(year=2000, month=1, day=2, hour=0, minute=0, second=0, microsecond=0)
-
-    def __iter__(self):
-        return self
 
-    def __next__(self) -> datetime:
-        x = self.current
-        if x == self.limit:
-            raise StopIteration
-        self.current += self.step
-        return x
 
+def sqlite_unsafe_pragmas(dbapi_connection, connection_record) -> None:
+    """No fsync() at all. A crash during the load may corrupt the database,
+    only acceptable for the initial population of a brand new one"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.close()
 
-class DateIterator:
-    def __init__(self, from_date: datetime, to_date: datetime):
-        self.step = timedelta(days=1)
-        self.current = from_date
-        self.limit = to_date
 
-    def __iter__(self):
-        return self
+@functools.lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """The database engine, tuned for bulk loads. lica creates it from DATABASE_URL
+    when first imported, so --help and argument errors don't pay for it"""
+    from lica.sqlalchemy.dbase import engine
 
-    def __next__(self) -> datetime:
-        x = self.current
-        if x > self.limit:
-            raise StopIteration
-        self.current += self.step
-        return x
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", sqlite_bulk_pragmas)
+    page_size = INSERT_PAGE_SIZE.get(engine.dialect.name, 1000)
+    return engine.execution_options(insertmanyvalues_page_size=page_size)
 
 
 # -------------
@@ -98,50 +189,21 @@ class DateIterator:
 
 def cli_populate_date(session: Session, args: Namespace) -> None:
     log.info("Generating Date values")
-    date_iterator = DateIterator(from_date=args.since, to_date=args.until)
-    date_objs = (
-        Date(
-            date_id=d.year * 10000 + d.month * 100 + d.day,
-            sql_date=d.strftime("%Y-%m-%d"),
-            day=int(d.strftime("%d")),
-            date=d.strftime("%d/%m/%Y"),
-            day_year=int(d.strftime("%j")),
-            julian_day=julian_day(d),
-            weekday=d.strftime("%A"),
-            weekday_abbr=d.strftime("%a"),
-            weekday_num=int(d.strftime("%w")),  # 0 = Sunday
-            month=d.strftime("%B"),
-            month_num=int(d.strftime("%m")),
-            month_abbr=d.strftime("%b"),
-            year=int(d.strftime("%Y")),
-        )
-        for d in date_iterator
-    )
-    for obj in date_objs:
-        session.add(obj)
+    columns = date_columns(args.since, args.until)
+    # Plain dicts and Core executemany INSERTs, no ORM unit of work per row
+    date_rows = (dict(zip(columns, values)) for values in zip(*columns.values()))
+    bulk_insert(session, Date, date_rows, args.batch_size)
 
 
 def cli_populate_time(session: Session, args: Namespace) -> None:
     log.info("Generating Time values")
-    time_iterator = TimeIterator(step_seconds=args.seconds)
-    time_objs = (
-        Time(
-            time_id=t.hour * 10000 + t.minute * 100 + t.second,
-            time=t.strftime("%H:%M:%S"),
-            hour=t.hour,
-            minute=t.minute,
-            second=t.second,
-            day_fraction=(t.hour * 3600 + t.minute * 60 + t.second) / (24 * 60 * 60),
-        )
-        for t in time_iterator
-    )
-    for obj in time_objs:
-        session.add(obj)
+    bulk_insert(session, Time, time_rows(args.seconds), args.batch_size)
 
 
 def cli_populate_location(session: Session, args: Namespace) -> None:
     log.info("Generating Default Unknown Location value")
-    location = Location(
+    # A single row, no need for an ORM object and its unit of work
+    stmt = insert(Location).values(
         location_id=-1,
         longitude=None,
         latitude=None,
@@ -155,12 +217,12 @@ def cli_populate_location(session: Session, args: Namespace) -> None:
         country="Unknown",
         timezone="Etc/UTC",
     )
-    session.add(location)
+    session.execute(stmt)
 
 
 def cli_populate_observer(session: Session, args: Namespace) -> None:
     log.info("Generating Default Observer Location value")
-    observer = Observer(
+    stmt = insert(Observer).values(
         observer_id=-1,
         type=ObserverType.ORG,
         name="Unknown",
@@ -168,7 +230,7 @@ def cli_populate_observer(session: Session, args: Namespace) -> None:
         valid_until=datetime(year=2999, month=12, day=31),
         valid_state=ValidState.CURRENT,
     )
-    session.add(observer)
+    session.execute(stmt)
 
 
 def cli_populate_all(session: Session, args: Namespace) -> None:
@@ -181,26 +243,45 @@ def cli_populate_all(session: Session, args: Namespace) -> None:
 def add_args(parser: ArgumentParser) -> None:
     subparser = parser.add_subparsers(dest="command", required=True)
     p = subparser.add_parser(
-        "date", parents=[prs.since(), prs.until()], help="Load initial Date values"
+        "date", parents=[prs.since(), prs.until(), prs.batch()], help="Load initial Date values"
     )
     p.set_defaults(func=cli_populate_date)
-    p = subparser.add_parser("time", parents=[prs.seconds()], help="Load initial Time values")
+    p = subparser.add_parser(
+        "time", parents=[prs.seconds(), prs.batch()], help="Load initial Time values"
+    )
     p.set_defaults(func=cli_populate_time)
     p = subparser.add_parser("location", parents=[], help="Load initial Location values")
     p.set_defaults(func=cli_populate_location)
     p = subparser.add_parser("observer", parents=[], help="Load initial Observer values")
     p.set_defaults(func=cli_populate_observer)
     p = subparser.add_parser(
-        "all", parents=[prs.since(), prs.until(), prs.seconds()], help="Load all initial values"
+        "all",
+        parents=[prs.since(), prs.until(), prs.seconds(), prs.batch(), prs.unsafe()],
+        help="Load all initial values",
     )
     p.set_defaults(func=cli_populate_all)
 
 
 def cli_main(args: Namespace) -> None:
     sqa_logging(args)
-    with Session() as session:
+    engine = get_engine()
+    if getattr(args, "batch_size", None) is None:
+        # A batch is what the driver sends in one round trip
+        args.batch_size = engine.get_execution_options()["insertmanyvalues_page_size"]
+    unsafe = getattr(args, "unsafe_fast_load", False) and engine.dialect.name == "sqlite"
+    if unsafe:
+        log.warning("Unsafe fast load: the database may be corrupted if interrupted")
+        event.listen(engine, "connect", sqlite_unsafe_pragmas)
+    with BulkSession(bind=engine) as session:
+        # Whatever the number of batches, a single transaction and a single COMMIT
         with session.begin():
             args.func(session, args)
+    if unsafe:
+        event.remove(engine, "connect", sqlite_unsafe_pragmas)
+        # Back to durable writes and the whole load moved from the WAL to the database file
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA synchronous=NORMAL")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
 
 
 def main():
@@ -18,7 +18,6 @@ from argparse import ArgumentParser, Namespace
 from lica.cli import execute
 from lica.sqlalchemy import sqa_logging
 from lica.sqlalchemy.model import Model
-from lica.sqlalchemy.dbase import engine
 
 # --------------
 # local imports
@@ -48,6 +47,9 @@ log = logging.getLogger(__name__.split(".")[-1])
 
 
 def cli_main(args: Namespace) -> None:
+    # The engine is created from DATABASE_URL on first import, not needed for --help
+    from lica.sqlalchemy.dbase import engine
+
     sqa_logging(args)
     with engine.begin():
         Model.metadata.drop_all(bind=engine)
@@ -16,7 +16,7 @@ from argparse import ArgumentParser
 # Third-party library imports
 # ----------------------------
 
-from lica.validators import vdate, vdir
+from lica.validators import vdate, vdir, vnat
 
 # --------------
 # local imports
@@ -67,6 +67,31 @@ def seconds() -> ArgumentParser:
     )
     return parser
 
+
+def batch() -> ArgumentParser:
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=vnat,
+        default=None,
+        metavar="<N>",
+        help="Rows per bulk INSERT (default: the database dialect page size)",
+    )
+    return parser
+
+
+def unsafe() -> ArgumentParser:
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--unsafe-fast-load",
+        action="store_true",
+        default=False,
+        help="Initial load only: no SQLite fsync() until the load is done",
+    )
+    return parser
+
+
 def ifile() -> ArgumentParser:
     parser = ArgumentParser(add_help=False)
     parser.add_argument(
@@ -74,7 +99,6 @@ def ifile() -> ArgumentParser:
         "--input-file",
         type=vecsvfile,
         required=True,
-        nargs="+", # Allows spaces in file name
         metavar="<File>",
         help="ECSV input file",
     )
@@ -87,6 +111,20 @@ def ifile() -> ArgumentParser:
     )
     return parser
 
+
+def ifiles() -> ArgumentParser:
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "-i",
+        "--input-file",
+        type=vecsvfile,
+        required=True,
+        nargs="+",
+        metavar="<File>",
+        help="ECSV input files",
+    )
+    return parser
+
 def ident() -> ArgumentParser:
     parser = ArgumentParser(add_help=False)
     parser.add_argument(
@@ -94,7 +132,6 @@ def ident() -> ArgumentParser:
         "--identifier",
         type=str,
         required=True,
-        nargs="+", # Allows spaces in file name
         metavar="<Id>",
         help="Observation identifier",
     )
@@ -12,21 +12,21 @@
 from collections import OrderedDict
 from typing import Optional, List
 from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
 
 # =====================
 # Third party libraries
 # =====================
 
-import pytz
-
 from sqlalchemy import (
     Enum,
     String,
     DateTime,
     ForeignKey,
+    Index,
     UniqueConstraint,
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship, declarative_base
+from sqlalchemy.orm import Mapped, mapped_column, relationship, DeclarativeBase
 
 from lica.sqlalchemy.model import metadata
 
@@ -47,6 +47,8 @@ from .. import (
 # Module constants
 # ================
 
+PERSON_TYPE = ObserverType.PERSON.value
+
 # =======================
 # Module global variables
 # =======================
@@ -56,93 +58,55 @@ from .. import (
 # Data Model, declarative ORM style
 # =================================
 
-Model = declarative_base(metadata=metadata)
+
+class Model(DeclarativeBase):
+    metadata = metadata
+
+    def _ordered_dict(self) -> OrderedDict:
+        """Column values in _DICT_KEYS order. The already sized _DICT_EMPTY template
+        is copied and then filled in place, no table growth nor reordering per call"""
+        r = self._DICT_EMPTY.copy()
+        values = self.__dict__
+        try:
+            for key in self._DICT_KEYS:
+                r[key] = values[key]
+        except KeyError:
+            # Expired, deferred or never set attributes are not in __dict__,
+            # let the instrumented attributes load them (or default to None)
+            for key in self._DICT_KEYS:
+                r[key] = getattr(self, key)
+        return r
+
 
 # ---------------------------------------------
 # Additional conveniente types for enumerations
 # ---------------------------------------------
 
-ObserverEnum: Enum = Enum(
-    ObserverType,
-    name="observer_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.title() for e in x],
-)
-
-PhotModelType: Enum = Enum(
-    PhotometerModel,
-    name="model_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.upper() for e in x],
-)
-
-
-SensorType: Enum = Enum(
-    Sensor,
-    name="sensor_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.upper() for e in x],
-)
-
-ValidStateType: Enum = Enum(
-    ValidState,
-    name="valid_state_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.title() for e in x],
-)
-
-TemperatureType: Enum = Enum(
-    Temperature,
-    name="temperature_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.title() for e in x],
-)
 
-HumidityType: Enum = Enum(
-    Humidity,
-    name="humidity_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.title() for e in x],
-)
+def enum_type(enum_cls, name: str, transform) -> Enum:
+    """Enumeration column type, stored as the transformed (title/upper case) enum values"""
+    # Enum values are immutable, transform them once here rather than in every callback
+    values = [transform(e.value) for e in enum_cls]
+    return Enum(
+        enum_cls,
+        name=name,
+        create_constraint=False,
+        metadata=Model.metadata,
+        validate_strings=True,
+        values_callable=lambda _: values,
+    )
 
-TimestampType: Enum = Enum(
-    Timestamp,
-    name="timestamp_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.title() for e in x],
-)
 
-CoordinatesType: Enum = Enum(
-    Coordinates,
-    name="coordinates_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.title() for e in x],
-)
+ObserverEnum: Enum = enum_type(ObserverType, "observer_type", str.title)
+PhotModelType: Enum = enum_type(PhotometerModel, "model_type", str.upper)
+SensorType: Enum = enum_type(Sensor, "sensor_type", str.upper)
+ValidStateType: Enum = enum_type(ValidState, "valid_state_type", str.title)
+TemperatureType: Enum = enum_type(Temperature, "temperature_type", str.title)
+HumidityType: Enum = enum_type(Humidity, "humidity_type", str.title)
+TimestampType: Enum = enum_type(Timestamp, "timestamp_type", str.title)
+CoordinatesType: Enum = enum_type(Coordinates, "coordinates_type", str.title)
+PopulationCentreType: Enum = enum_type(PopulationCentre, "population_type", str.title)
 
-PopulationCentreType: Enum = Enum(
-    PopulationCentre,
-    name="population_type",
-    create_constraint=False,
-    metadata=Model.metadata,
-    validate_strings=True,
-    values_callable=lambda x: [e.value.title() for e in x],
-)
 # ------------------
 # Auxiliar functions
 # ------------------
@@ -151,13 +115,9 @@ PopulationCentreType: Enum = Enum(
 def observer_name(observer: dict) -> str:
     """Handy formatting tool to get a good observer name"""
     name = observer["name"]
-    if ObserverType(observer["type"]) == ObserverType.PERSON:
-        long_affil = observer["affiliation"] if observer["affiliation"] is not None else ""
-        short_affil = observer["acronym"] if observer["acronym"] is not None else ""
-    else:
-        long_affil = ""
-        short_affil = observer["acronym"] if observer["acronym"] is not None else ""
-    affiliation = short_affil or long_affil
+    # As given by Observer.to_dict(), type is already the enum value string
+    long_affil = observer.get("affiliation") if observer["type"] == PERSON_TYPE else None
+    affiliation = observer.get("acronym") or long_affil or ""
     return f"{name} ({affiliation})" if affiliation else name
 
 
@@ -240,26 +200,29 @@ class Observer(Model):
         {"extend_existing": True},  # extend_existing is for streamlit only :-(
     )
 
+    # Keys in Astropy's table metadata order. Their values are taken from the instance
+    # __dict__, no per column descriptor access
+    _DICT_KEYS = (
+        "type",
+        "name",
+        "nickname",
+        "affiliation",
+        "acronym",
+        "website_url",
+        "email",
+        "valid_since",
+        "valid_until",
+        "valid_state",
+    )
+    _DICT_EMPTY = OrderedDict.fromkeys(_DICT_KEYS)
+
+    # Primary key & name only, debug output or logging shouldn't serialize the whole entity
     def __repr__(self) -> str:
-        return str(self.to_dict())
+        return f"<Observer {self.observer_id} {self.name!r}>"
 
     def to_dict(self) -> OrderedDict:
         """To be written as Astropy's table metadata"""
-        r = OrderedDict(
-            (key, self.__dict__[key])
-            for key in (
-                "type",
-                "name",
-                "nickname",
-                "affiliation",
-                "acronym",
-                "website_url",
-                "email",
-                "valid_since",
-                "valid_until",
-                "valid_state",
-            )
-        )
+        r = self._ordered_dict()
         # Patch enum & date values
         r["type"] = self.type.value
         r["valid_since"] = self.valid_since.isoformat()
@@ -299,27 +262,27 @@ class Location(Model):
         {"extend_existing": True},  # extend_existing is for streamlit only :-(
     )
 
+    _DICT_KEYS = (
+        "longitude",
+        "latitude",
+        "masl",
+        "coords_meas",
+        "place",
+        "population_centre",
+        "population_centre_type",
+        "sub_region",
+        "region",
+        "country",
+        "timezone",
+    )
+    _DICT_EMPTY = OrderedDict.fromkeys(_DICT_KEYS)
+
     def __repr__(self) -> str:
-        return str(self.to_dict())
+        return f"<Location {self.location_id} {self.place!r}>"
 
     def to_dict(self) -> OrderedDict:
         """To be written as Astropy's table metadata"""
-        r = OrderedDict(
-            (key, self.__dict__[key])
-            for key in (
-                "longitude",
-                "latitude",
-                "masl",
-                "coords_meas",
-                "place",
-                "population_centre",
-                "population_centre_type",
-                "sub_region",
-                "region",
-                "country",
-                "timezone",
-            )
-        )
+        r = self._ordered_dict()
         # Patch enum & date values
         r["coords_meas"] = self.coords_meas.value
         r["population_centre_type"] = (
@@ -350,21 +313,21 @@ class Photometer(Model):
         {"extend_existing": True},  # This is for streamlit only :-(
     )
 
+    _DICT_KEYS = (
+        "model",
+        "name",
+        "sensor",
+        "zero_point",
+        "fov",
+        "comment",
+    )
+    _DICT_EMPTY = OrderedDict.fromkeys(_DICT_KEYS)
+
     def __repr__(self) -> str:
-        return str(self.to_dict())
+        return f"<Photometer {self.phot_id} {self.name!r}>"
 
     def to_dict(self) -> OrderedDict:
-        r = OrderedDict(
-            (key, self.__dict__[key])
-            for key in (
-                "model",
-                "name",
-                "sensor",
-                "zero_point",
-                "fov",
-                "comment",
-            )
-        )
+        r = self._ordered_dict()
         # Patch enum & date values
         r["model"] = self.model.value
         r["sensor"] = self.sensor.value
@@ -412,30 +375,30 @@ class Observation(Model):
 
     __table_args__ = {"extend_existing": True}  # This is for streamlit only :-(
 
+    _DICT_KEYS = (
+        "identifier",
+        "digest",
+        "timestamp_1",
+        "timestamp_2",
+        "timestamp_meas",
+        "temperature_1",
+        "temperature_2",
+        "temperature_meas",
+        "humidity_1",
+        "humidity_2",
+        "humidity_meas",
+        "weather_conditions",
+        "image_url",
+        "other_observers",
+        "comment",
+    )
+    _DICT_EMPTY = OrderedDict.fromkeys(_DICT_KEYS)
+
     def __repr__(self) -> str:
-        return str(self.to_dict())
+        return f"<Observation {self.obs_id} {self.identifier!r}>"
 
     def to_dict(self) -> OrderedDict:
-        r = OrderedDict(
-            (key, self.__dict__[key])
-            for key in (
-                "identifier",
-                "digest",
-                "timestamp_1",
-                "timestamp_2",
-                "timestamp_meas",
-                "temperature_1",
-                "temperature_2",
-                "temperature_meas",
-                "humidity_1",
-                "humidity_2",
-                "humidity_meas",
-                "weather_conditions",
-                "image_url",
-                "other_observers",
-                "comment",
-            )
-        )
+        r = self._ordered_dict()
         # Patch enum & date values
         r["timestamp_meas"] = self.timestamp_meas.value
         r["temperature_meas"] = self.temperature_meas.value
@@ -450,8 +413,9 @@ class Measurement(Model):
     date_id: Mapped[int] = mapped_column(ForeignKey("nx_date_t.date_id"))
     time_id: Mapped[int] = mapped_column(ForeignKey("nx_time_t.time_id"))
     observer_id: Mapped[int] = mapped_column(ForeignKey("nx_observer_t.observer_id"))
-    location_id: Mapped[int] = mapped_column(ForeignKey("nx_location_t.location_id"))
-    phot_id: Mapped[int] = mapped_column(ForeignKey("nx_photometer_t.phot_id"))
+    # date_id & observer_id lead the composite indexes below, no index of their own
+    location_id: Mapped[int] = mapped_column(ForeignKey("nx_location_t.location_id"), index=True)
+    phot_id: Mapped[int] = mapped_column(ForeignKey("nx_photometer_t.phot_id"), index=True)
     obs_id: Mapped[int] = mapped_column(ForeignKey("nx_observation_t.obs_id"), index=True)
     # Sequence number within the batch, TAS only
     sequence: Mapped[Optional[int]]
@@ -480,41 +444,56 @@ class Measurement(Model):
 
     # These are relationship attributes
     # These are not real columns, part of the ORM magic
-    # Used in insertions of new measurements
-    location: Mapped["Location"] = relationship()
-    observer: Mapped["Observer"] = relationship()
-    photometer: Mapped["Photometer"] = relationship()
-    observation: Mapped["Observation"] = relationship(back_populates="measurements")
-    date: Mapped["Date"] = relationship()
-    time: Mapped["Time"] = relationship()
+    # Measurements are bulk inserted with the foreign key ids and read with explicit joins.
+    # lazy="raise" turns any per row lazy load (one SELECT per measurement) into an error,
+    # use a join or selectinload() instead.
+    location: Mapped["Location"] = relationship(lazy="raise")
+    observer: Mapped["Observer"] = relationship(lazy="raise")
+    photometer: Mapped["Photometer"] = relationship(lazy="raise")
+    observation: Mapped["Observation"] = relationship(
+        back_populates="measurements", lazy="raise"
+    )
+    date: Mapped["Date"] = relationship(lazy="raise")
+    time: Mapped["Time"] = relationship(lazy="raise")
 
-    __table_args__ = {"extend_existing": True}  # This is for streamlit only :-(
+    __table_args__ = (
+        # Date range searches, most recent first
+        Index("ix_meas_dt", "date_id", "time_id"),
+        # Observer searches within a date range
+        Index("ix_meas_obs", "observer_id", "date_id"),
+        {"extend_existing": True},  # extend_existing is for streamlit only :-(
+    )
 
     # We can't establish uniqueness of measurements because manual measurements
     # don't have a unique timestamps, only an initial, final or mid-term timestamp
 
+    _DICT_KEYS = (
+        "sequence",
+        "azimuth",
+        "altitude",
+        "zenital",
+        "magnitude",
+        "frequency",
+        "sensor_temp",
+        "sky_temp",
+        "longitude",
+        "latitude",
+        "masl",
+        "bat_volt",
+    )
+    _DICT_EMPTY = OrderedDict.fromkeys(_DICT_KEYS)
+
     def utc_time(self) -> datetime:
-        utc = str(self.date_id) + " " + self.time.time
-        return datetime.strptime(utc, "%Y%m%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        # Straight from the YYYYMMDD & HHMMSS keys, no strptime() nor Time row to load
+        year, month_day = divmod(self.date_id, 10000)
+        month, day = divmod(month_day, 100)
+        hour, minute_second = divmod(self.time_id, 10000)
+        minute, second = divmod(minute_second, 100)
+        return datetime(year, month, day, hour, minute, second, tzinfo=timezone.utc)
 
     def local_time(self, timezone: str) -> datetime:
-        return self.utc_time().astimezone(pytz.timezone(timezone))
+        # ZoneInfo instances are cached by key, so this allocates nothing after the first call
+        return self.utc_time().astimezone(ZoneInfo(timezone))
 
     def to_dict(self) -> OrderedDict:
-        return OrderedDict(
-            (key, self.__dict__[key])
-            for key in (
-                "sequence",
-                "azimuth",
-                "altitude",
-                "zenital",
-                "magnitude",
-                "frequency",
-                "sensor_temp",
-                "sky_temp",
-                "longitude",
-                "latitude",
-                "masl",
-                "bat_volt",
-            )
-        )
+        return self._ordered_dict()
@@ -13,38 +13,95 @@ import logging
 import hashlib
 import os
 
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Iterator, Optional
 
 # -------------------
 # Third party imports
 # -------------------
 
-from sqlalchemy import select
+from sqlalchemy import select, insert, func
+from sqlalchemy.exc import SQLAlchemyError
 
 from lica.sqlalchemy.dbase import Session
 
+import numpy as np
+import yaml
+
 import astropy.io.ascii
 from astropy.table import Table
+from astropy.io.misc.yaml import AstropyLoader
 
 # --------------
 # local imports
 # -------------
 
 from .. import PhotometerModel
-from ..dbase.model import Observation
+from ..dbase.model import Photometer, Observer, Observation, Location, Measurement
 
-from .tas import TASLoader, TASExporter, TASImporter
+from .tas import TASLoader, TASExporter, TASImporter, EXPORTED_COLUMNS
 from .sqm import SQMLoader
 
 # get the root logger
 log = logging.getLogger(__name__.split(".")[-1])
 
 
+def _construct_omap(loader, node):
+    """!!omap as a plain (ordered) dict, like AstroPy does"""
+    omap = dict()
+    yield omap
+    for item in node.value:
+        ((key, value),) = item.value
+        omap[loader.construct_object(key)] = loader.construct_object(value)
+
+
+class _HeaderLoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+    """ECSV header loader using the libyaml C parser when available,
+    with the same constructors AstroPy's own (pure Python) ECSV loader has"""
+
+    yaml_constructors = dict(AstropyLoader.yaml_constructors)
+    yaml_multi_constructors = dict(AstropyLoader.yaml_multi_constructors)
+
+
+_HeaderLoader.add_constructor("tag:yaml.org,2002:omap", _construct_omap)
+
+
+class _HashingReader:
+    """Binary file wrapper that feeds a hash object with every byte read"""
+
+    def __init__(self, file_obj: BinaryIO, hasher):
+        self.file_obj = file_obj
+        self.hasher = hasher
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file_obj.read(size)
+        self.hasher.update(data)
+        return data
+
+
+def _insert_measurements(session: Session, rows: list[dict]) -> None:
+    """Bulk insert the measurement rows within the session transaction.
+    PostgreSQL through psycopg 3 streams them with COPY, otherwise executemany()"""
+    if not rows:
+        return
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg":
+        columns = tuple(rows[0].keys())
+        sql = f"COPY {Measurement.__tablename__} ({', '.join(columns)}) FROM STDIN"
+        with session.connection().connection.cursor() as cursor:
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(tuple(row[col] for col in columns))
+    else:
+        session.execute(insert(Measurement), rows)
+
+
 def uploader(session: Session, file_obj: BinaryIO, **kwargs) -> Optional[Observation]:
     observation = None
-    digest = hashlib.md5(file_obj.read()).hexdigest()
-    file_obj.seek(0)  # Rewind to conver it to AstroPy Table
-    table = astropy.io.ascii.read(file_obj, format="ecsv")
+    # The file is hashed while it is read for parsing, a single pass with no rewind.
+    # Still MD5 as stored digests are MD5.
+    md5 = hashlib.md5()
+    table = read_ecsv(_HashingReader(file_obj, md5))
+    digest = md5.hexdigest()
     name = table.meta["keywords"]["photometer"]
     with session.begin():
         subloader = (
@@ -56,83 +113,193 @@ def uploader(session: Session, file_obj: BinaryIO, **kwargs) -> Optional[Observa
         photometer = subloader.photometer()
         location = subloader.location()
         observer = subloader.observer()
-        for item in (
-            photometer,
-            location,
-            observer,
-            observation,
-        ):
-            session.add(item)
-        measurements = subloader.measurements(photometer, observation, location, observer)
-        for measurement in measurements:
-            session.add(measurement)
+        session.add_all((photometer, location, observer, observation))
         try:
+            session.flush()  # Get the parent ids needed by the measurement rows
+            measurements = subloader.measurements(photometer, observation, location, observer)
+            # Single bulk insert with plain dicts, not one ORM object per row
+            _insert_measurements(session, measurements)
             session.commit()
         except Exception as e:
+            session.rollback()
             log.error(e)
             log.error("Trying to reload the same observation file?")
         finally:
             return observation
 
 
-def database_import(session: Session, file_obj: BinaryIO) -> Optional[Observation]:
+def _ecsv_body(header: dict, body: list[str]) -> Optional[Table]:
+    """Read the CSV body with the C reader and apply the ECSV header schema.
+    Returns None if the body can't be faithfully typed this way."""
+    if header.get("delimiter", " ") != "," or not body:
+        return None
+    schema = header["datatype"]
+    table = astropy.io.ascii.read(body, format="csv", fast_reader="force")
+    if table.colnames != [col["name"] for col in schema]:
+        return None
+    for col in schema:
+        if set(col) - {"name", "datatype", "unit"}:
+            return None  # subtypes, formats, column meta ...
+        name = col["name"]
+        column = table[name]
+        if col["datatype"] == "string":
+            if column.dtype.kind != "U":
+                return None  # i.e. numeric looking strings, can't be recovered
+        else:
+            dtype = np.dtype(col["datatype"])
+            if column.dtype.kind not in ("iuf" if dtype.kind == "f" else dtype.kind):
+                return None
+            if column.dtype != dtype:
+                table[name] = column = column.astype(dtype)
+        column.unit = col.get("unit")
+    table.meta = header.get("meta", dict())
+    return table
+
+
+def observation_digests(session: Session) -> set[str]:
+    """All the observation digests already in the database, in a single query"""
+    return set(session.scalars(select(Observation.digest)))
+
+
+def read_ecsv(source: str | BinaryIO) -> Table:
+    """Parse an ECSV file. Picklable, so it can run in a worker process.
+    AstroPy's ECSV reader parses the CSV body in pure Python, so the YAML header
+    is parsed on its own and the body with the C CSV reader whenever possible."""
+    if isinstance(source, str):
+        with open(source, encoding="utf-8") as fd:
+            text = fd.read()
+    else:
+        text = source.read()
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    lines = text.splitlines()
+    if lines and lines[0].startswith("# %ECSV"):
+        n = next((i for i, line in enumerate(lines) if not line.startswith("#")), len(lines))
+        try:
+            header = yaml.load("\n".join(line[2:] for line in lines[1:n]), Loader=_HeaderLoader)
+        except yaml.YAMLError:
+            header = None  # Let AstroPy report it
+        table = _ecsv_body(header, lines[n:]) if isinstance(header, dict) else None
+        if table is not None:
+            return table
+    return astropy.io.ascii.read(text, format="ecsv")
+
+
+def database_import(
+    session: Session, source: str | BinaryIO | Table, cache: dict | None = None
+) -> Optional[Observation]:
+    """Source may be either a file path, an already open file object
+    or an already parsed table (see read_ecsv()).
+    Pass the same cache dict when importing several files in a row so that
+    photometers, locations & observers are only looked up once."""
     # THIS MUST BE REVIEWED
     observation = None
-    table = astropy.io.ascii.read(file_obj, format="ecsv")
+    table = source if isinstance(source, Table) else read_ecsv(source)
     log.info(table.meta)
-    with session.begin():
-        importer = TASImporter(session, table)
-        observation = importer.observation()
-        photometer = importer.photometer()
-        location = importer.location()
-        observer = importer.observer()
-        for item in (
-            photometer,
-            location,
-            observer,
-            observation,
-        ):
-            session.add(item)
-        measurements = importer.measurements(photometer, observation, location, observer)
-        for measurement in measurements:
-            session.add(measurement)
-        try:
-            session.commit()
-        except Exception as e:
-            log.error(e)
-            log.error("Trying to reload the same observation file?")
-        finally:
-            return observation
+    # Within an already started transaction (i.e. a whole folder import)
+    # a file only gets a SAVEPOINT, so a bad file rolls back on its own
+    # and everything else is committed once at the end.
+    known = set(cache) if cache is not None else set()
+    try:
+        with session.begin_nested() if session.in_transaction() else session.begin():
+            observation = _import_table(session, table, cache)
+    except SQLAlchemyError as e:
+        _forget_parents(cache, known)
+        log.error(e)
+        log.error("Trying to reload the same observation file?")
+    except Exception:
+        _forget_parents(cache, known)
+        raise
+    return observation
 
 
-def _recall_observation(session: Session, observation: Observation) -> Table:
-    # This will trigger several SQL queries
-    measurements = observation.measurements
-    location = measurements[0].location
-    observer = measurements[0].observer
-    photometer = measurements[0].photometer
+def _forget_parents(cache: dict | None, known: set) -> None:
+    """Drop the parents cached by a rolled back import, their rows no longer exist"""
+    if cache is not None:
+        for key in cache.keys() - known:
+            del cache[key]
+
+
+def _import_table(session: Session, table: Table, cache: dict | None) -> Observation:
+    importer = TASImporter(session, table, cache)
+    observation = importer.observation()
+    photometer = importer.photometer()
+    location = importer.location()
+    observer = importer.observer()
+    session.add_all((photometer, location, observer, observation))
+    session.flush()  # Get the parent ids needed by the measurement rows
+    measurements = importer.measurements(photometer, observation, location, observer)
+    _insert_measurements(session, measurements)
+    return observation
+
+
+def _measurements_table(
+    session: Session,
+    photometer: Photometer,
+    observation: Observation,
+    location: Location,
+    observer: Observer,
+) -> Table:
     if photometer.model == PhotometerModel.TAS:
+        # Core table columns, so the rows skip the ORM result processing altogether
+        columns = Measurement.__table__.c
+        q = (
+            select(*(columns[name] for name in EXPORTED_COLUMNS))
+            .where(columns.obs_id == observation.obs_id)
+            .order_by(columns.meas_id)
+        )
+        measurements = session.execute(q).all()
         table = TASExporter().to_table(photometer, observation, location, observer, measurements)
     else:
         raise NotImplementedError
     return table
 
 
+def _parents_query():
+    return (
+        select(Photometer, Location, Observer)
+        .select_from(Measurement)
+        .join(Photometer, Measurement.phot_id == Photometer.phot_id)
+        .join(Location, Measurement.location_id == Location.location_id)
+        .join(Observer, Measurement.observer_id == Observer.observer_id)
+    )
+
+
+def recall_observation(session: Session, observation: Observation) -> Table:
+    """Observation as an AstroPy Table. Measurements are fetched as plain column
+    rows in a single query, without building ORM objects nor lazy loading."""
+    q = _parents_query().where(Measurement.obs_id == observation.obs_id).limit(1)
+    photometer, location, observer = session.execute(q).one()
+    return _measurements_table(session, photometer, observation, location, observer)
+
+
+def recall_observations(session: Session) -> Iterator[tuple[Observation, Table]]:
+    """All observations along with their AstroPy Tables. The observations and their photometer,
+    location & observer are fetched at once, then one measurements query each."""
+    first = select(func.min(Measurement.meas_id)).group_by(Measurement.obs_id)
+    q = (
+        _parents_query()
+        .add_columns(Observation)
+        .join(Observation, Measurement.obs_id == Observation.obs_id)
+        .where(Measurement.meas_id.in_(first))
+        .order_by(Observation.obs_id)
+    )
+    for photometer, location, observer, observation in session.execute(q):
+        yield observation, _measurements_table(session, photometer, observation, location, observer)
+
+
 def database_export(session: Session, out_dir: str, identifier: str | None) -> None:
     if identifier is not None:
         q = select(Observation).where(Observation.identifier == identifier)
         observation = session.scalars(q).one_or_none()
         if observation:
-            table = _recall_observation(session, observation)
+            table = recall_observation(session, observation)
         else:
             log.warn("No observation found with identifier %s", identifier)
         path = os.path.join(out_dir, identifier + ".ecsv")
         table.write(path, delimiter=",", format="ascii.ecsv", overwrite=True)
     else:
-        q = select(Observation)
-        observations = session.scalars(q).all()
-        for observation in observations:
+        for observation, table in recall_observations(session):
             identifier = observation.identifier
-            table = _recall_observation(session, observation)
             path = os.path.join(out_dir, identifier + ".ecsv")
             table.write(path, delimiter=",", format="ascii.ecsv", overwrite=True)
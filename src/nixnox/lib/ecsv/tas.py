@@ -12,6 +12,7 @@ import os
 import logging
 
 from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
 from typing import Iterable
 
 # -------------------
@@ -20,11 +21,11 @@ from typing import Iterable
 
 import numpy as np
 
-from sqlalchemy import select
+from sqlalchemy import select, bindparam
 from lica.sqlalchemy.dbase import Session
 
 import astropy.io.ascii
-from astropy.table import Table
+from astropy.table import Table, MaskedColumn
 from astropy import units as u
 
 from lica.asyncio.photometer import Sensor
@@ -59,6 +60,68 @@ from .excp import AlreadyExistsError
 # ----------------
 
 
+# Exported TAS table columns in file order as (name, dtype, unit).
+# Whole columns are built with a fixed dtype instead of inferring it row by row
+TAS_SCHEMA = (
+    ("ind", np.int64, None),
+    ("Datetime", np.str_, None),
+    ("UT_Datetime", np.str_, None),
+    ("Temp_IR", np.float64, u.deg_C),
+    ("T_sens", np.float64, u.deg_C),
+    ("Mag", np.float64, None),
+    ("Hz", np.float64, u.Hz),
+    ("Alt", np.float64, u.deg),
+    ("Azi", np.float64, u.deg),
+    ("Lat", np.float64, u.deg),
+    ("Long", np.float64, u.deg),
+    ("SL", np.float64, u.m),
+    ("VBat", np.float64, u.V),
+)
+
+# Measurement attribute and TAS table column name
+TAS_MEASUREMENT_COLUMNS = (
+    ("sequence", "ind"),
+    ("azimuth", "Azi"),
+    ("altitude", "Alt"),
+    ("magnitude", "Mag"),
+    ("frequency", "Hz"),
+    ("sky_temp", "Temp_IR"),
+    ("sensor_temp", "T_sens"),
+    ("longitude", "Long"),
+    ("latitude", "Lat"),
+    ("masl", "SL"),
+    ("bat_volt", "VBat"),
+)
+
+# Measurement columns needed by TASExporter.to_table()
+EXPORTED_COLUMNS = (
+    "date_id",
+    "time_id",
+    "sequence",
+    "sky_temp",
+    "sensor_temp",
+    "magnitude",
+    "frequency",
+    "altitude",
+    "azimuth",
+    "latitude",
+    "longitude",
+    "masl",
+    "bat_volt",
+)
+
+# Lookup statements built once, with the values bound at execution time
+OBSERVATION_BY_DIGEST = select(Observation).where(Observation.digest == bindparam("digest"))
+PHOTOMETER_BY_NAME = select(Photometer).where(
+    Photometer.name == bindparam("name"), Photometer.model == bindparam("model")
+)
+LOCATION_BY_COORDS = select(Location).where(
+    Location.longitude == bindparam("longitude"), Location.latitude == bindparam("latitude")
+)
+OBSERVER_BY_NAME = select(Observer).where(
+    Observer.type == bindparam("type"), Observer.name == bindparam("name")
+)
+
 # -----------------------
 # Module global variables
 # -----------------------
@@ -72,6 +135,87 @@ log = logging.getLogger(__name__.split(".")[-1])
 # -------------------
 
 
+def date_time_ids(tstamps: Iterable[str]) -> tuple[list[int], list[int]]:
+    """Date (YYYYMMDD) and Time (HHMMSS) dimension ids for a whole column of
+    "YYYY-MM-DD HH:MM:SS" or ISO 8601 timestamps, parsed once by NumPy.
+    Any UTC offset suffix is ignored, as strftime() on the parsed value did."""
+    tstamps = np.asarray(tstamps, dtype="U19").astype("datetime64[s]")
+    days = tstamps.astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]")
+    day = (days - months).astype(np.int64) + 1
+    month = (months - years).astype(np.int64) + 1
+    year = years.astype(np.int64) + 1970
+    seconds = (tstamps - days).astype(np.int64)
+    hour, seconds = np.divmod(seconds, 3600)
+    minute, second = np.divmod(seconds, 60)
+    date_ids = year * 10000 + month * 100 + day
+    time_ids = hour * 10000 + minute * 100 + second
+    return date_ids.tolist(), time_ids.tolist()
+
+
+def iso_timestamps(date_ids: Iterable[int], time_ids: Iterable[int], tz) -> tuple[list, list]:
+    """Local and UTC ISO 8601 timestamps for whole columns of Date (YYYYMMDD) and
+    Time (HHMMSS) dimension ids, as datetime.isoformat() would give them.
+    The UTC offset is only looked up once per distinct minute, time zone
+    transitions (at least since 1970) happen at whole minutes"""
+    date_ids = np.asarray(date_ids, dtype=np.int64)
+    time_ids = np.asarray(time_ids, dtype=np.int64)
+    year, month_day = np.divmod(date_ids, 10000)
+    month, day = np.divmod(month_day, 100)
+    hour, minute_second = np.divmod(time_ids, 10000)
+    minute, second = np.divmod(minute_second, 100)
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+    seconds = (hour * 3600 + minute * 60 + second).astype("timedelta64[s]")
+    utc = days.astype("datetime64[s]") + seconds
+    minutes, index = np.unique(utc.astype("datetime64[m]"), return_inverse=True)
+    offsets = np.empty(len(minutes), dtype="timedelta64[s]")
+    suffixes = np.empty(len(minutes), dtype=object)
+    for i, value in enumerate(minutes.tolist()):
+        local = value.replace(tzinfo=timezone.utc).astimezone(tz)
+        offsets[i] = local.utcoffset()
+        suffixes[i] = local.isoformat()[19:]
+    local = np.datetime_as_string(utc + offsets[index], unit="s").tolist()
+    utc = np.datetime_as_string(utc, unit="s").tolist()
+    return (
+        [tstamp + suffix for tstamp, suffix in zip(local, suffixes[index].tolist())],
+        [tstamp + "+00:00" for tstamp in utc],
+    )
+
+
+def measurement_rows(
+    table: Table,
+    photometer: Photometer,
+    observation: Observation,
+    location: Location,
+    observer: Observer,
+) -> list[dict]:
+    """Measurement rows as plain dicts, ready for a bulk INSERT.
+    The parent objects must have been flushed already to get their ids.
+    Each column is converted to Python values once, instead of indexing table rows."""
+    n = len(table)
+    date_ids, time_ids = date_time_ids(table["UT_Datetime"])
+    # Optional columns are all None, masked values become None too
+    columns = {
+        key: table[name].tolist() if name in table.colnames else [None] * n
+        for key, name in TAS_MEASUREMENT_COLUMNS
+    }
+    # A single vector subtraction for the whole column
+    columns["zenital"] = (90.0 - table["Alt"]).tolist()
+    parents = dict(
+        phot_id=photometer.phot_id,
+        observer_id=observer.observer_id,
+        location_id=location.location_id,
+        obs_id=observation.obs_id,
+    )
+    keys = ("date_id", "time_id", *columns.keys())
+    return [
+        dict(parents, **dict(zip(keys, values)))
+        for values in zip(date_ids, time_ids, *columns.values())
+    ]
+
+
 class TASLoader:
     def __init__(self, session: Session, table: Table, extra_path: str):
         self.session = session
@@ -90,8 +234,7 @@ class TASLoader:
         t_final = datetime.strptime(max(self.table["UT_Datetime"]), self.tstamp_fmt)
         delta_t = (t_final - t_initial).total_seconds()
         mid_time = (t_initial + timedelta(seconds=(delta_t / 2) + 0.5)).replace(microsecond=0)
-        q = select(Observation).where(Observation.digest == digest)
-        obs = self.session.scalars(q).one_or_none()
+        obs = self.session.scalars(OBSERVATION_BY_DIGEST, {"digest": digest}).one_or_none()
         if obs:
             raise AlreadyExistsError(str(obs))
         else:
@@ -111,8 +254,8 @@ class TASLoader:
         model = PhotometerModel.TAS
         comments = self.table.meta["keywords"]["comments"].split()
         zero_point = float(comments[2].split(":")[-1])
-        q = select(Photometer).where(Photometer.name == name, Photometer.model == model)
-        return self.session.scalars(q).one_or_none() or Photometer(
+        params = {"name": name, "model": model}
+        return self.session.scalars(PHOTOMETER_BY_NAME, params).one_or_none() or Photometer(
             model=model,
             name=name,
             zero_point=zero_point,
@@ -124,8 +267,8 @@ class TASLoader:
         latitude = np.median(self.table["Lat"])
         masl = np.median(self.table["SL"])
         coords_meas = Coordinates.MEDIAN
-        q = select(Location).where(Location.longitude == longitude, Location.latitude == latitude)
-        location = self.session.scalars(q).one_or_none()
+        params = {"longitude": longitude, "latitude": latitude}
+        location = self.session.scalars(LOCATION_BY_COORDS, params).one_or_none()
         if location is None:
             result = geolocate(
                 longitude=longitude,
@@ -154,8 +297,8 @@ class TASLoader:
         name = self.table.meta["keywords"]["author"]
         affiliation = self.table.meta["keywords"].get("association")
         obs_type = ObserverType.PERSON
-        q = select(Observer).where(Observer.type == obs_type, Observer.name == name)
-        return self.session.scalars(q).one_or_none() or Observer(
+        params = {"type": obs_type, "name": name}
+        return self.session.scalars(OBSERVER_BY_NAME, params).one_or_none() or Observer(
             type=ObserverType.PERSON,
             name=self.table.meta["keywords"]["author"],
             affiliation=affiliation,
@@ -170,35 +313,13 @@ class TASLoader:
         observation: Observation,
         location: Location,
         observer: Observer,
-    ) -> Iterable[Measurement]:
-        measurements = list()
-        for row in self.table:
-            tstamp = datetime.strptime(row["UT_Datetime"], self.tstamp_fmt)
-            measurement = Measurement(
-                date_id=int(tstamp.strftime("%Y%m%d")),
-                time_id=int(tstamp.strftime("%H%M%S")),
-                photometer=photometer,
-                observer=observer,
-                location=location,
-                observation=observation,
-                sequence=int(row["ind"]),
-                azimuth=row["Azi"],
-                altitude=row["Alt"],
-                zenital=90.0 - row["Alt"],
-                magnitude=row["Mag"],
-                frequency=row.get("Hz"),
-                sky_temp=row.get("Temp_IR"),
-                sensor_temp=row.get("T_sens"),
-                longitude=row.get("Long"),
-                latitude=row.get("Lat"),
-                masl=row.get("SL"),
-                bat_volt=row.get("VBat"),
-            )
-            measurements.append(measurement)
+    ) -> list[dict]:
+        """See measurement_rows(), with the battery voltages filled in"""
+        measurements = measurement_rows(self.table, photometer, observation, location, observer)
         self.fill_vbat(measurements)
         return measurements
 
-    def fill_vbat(self, measurements: Iterable[Measurement]) -> None:
+    def fill_vbat(self, measurements: list[dict]) -> None:
         """Take the raw TAS file to extract battery voltages"""
         if self.extra_path:
             names = (
@@ -221,22 +342,32 @@ class TASLoader:
                     fd, format="csv", names=names, data_start=1, delimiter="\t"
                 )
                 for measurement, extra in zip(measurements, extra_table):
-                    assert measurement.sequence == int(extra["ind"])
-                    measurement.bat_volt = float(extra["Bat"])
+                    assert measurement["sequence"] == int(extra["ind"])
+                    measurement["bat_volt"] = float(extra["Bat"])
 
 
 class TASImporter:
-    def __init__(self, session: Session, table: Table):
+    def __init__(self, session: Session, table: Table, cache: dict | None = None):
         self.session = session
         self.table = table
         self.tstamp_fmt = "%Y-%m-%dT%H:%M:%S%z"
+        # Photometers, locations & observers already resolved,
+        # shared by the importers of a whole folder.
+        # It may also hold the set of known observation digests under the Observation key.
+        self.cache = cache if cache is not None else dict()
 
     def observation(self) -> Observation:
         obs_dict = self.table.meta["Observation"]
-        q = select(Observation).where(Observation.digest == obs_dict["digest"])
-        previous = self.session.scalars(q).one_or_none()
-        if previous:
-            raise AlreadyExistsError(previous)
+        digest = obs_dict["digest"]
+        digests = self.cache.get(Observation)
+        # With all the known digests at hand, only duplicates need a lookup
+        if digests is None or digest in digests:
+            params = {"digest": digest}
+            previous = self.session.scalars(OBSERVATION_BY_DIGEST, params).one_or_none()
+            if previous:
+                raise AlreadyExistsError(previous)
+        if digests is not None:
+            digests.add(digest)
         return Observation(
             identifier=obs_dict["identifier"],
             digest=obs_dict["digest"],
@@ -259,22 +390,29 @@ class TASImporter:
         phot_dict = self.table.meta["Photometer"]
         name = phot_dict["name"]
         model = PhotometerModel(phot_dict["model"])
-        q = select(Photometer).where(Photometer.name == name, Photometer.model == model)
-        return self.session.scalars(q).one_or_none() or Photometer(
-            model=model,
-            name=name,
-            sensor=Sensor(phot_dict["sensor"]),
-            fov=float(phot_dict["fov"]),
-            zero_point=float(phot_dict["zero_point"]),
-            comment=phot_dict["comment"],
-        )
+        key = (Photometer, name, model)
+        if key not in self.cache:
+            params = {"name": name, "model": model}
+            found = self.session.scalars(PHOTOMETER_BY_NAME, params).one_or_none()
+            self.cache[key] = found or Photometer(
+                model=model,
+                name=name,
+                sensor=Sensor(phot_dict["sensor"]),
+                fov=float(phot_dict["fov"]),
+                zero_point=float(phot_dict["zero_point"]),
+                comment=phot_dict["comment"],
+            )
+        return self.cache[key]
 
     def location(self) -> Location:
         loc_dict = self.table.meta["Location"]
         longitude = float(loc_dict["longitude"])
         latitude = float(loc_dict["latitude"])
-        q = select(Location).where(Location.longitude == longitude, Location.latitude == latitude)
-        location = self.session.scalars(q).one_or_none()
+        key = (Location, longitude, latitude)
+        if key in self.cache:
+            return self.cache[key]
+        params = {"longitude": longitude, "latitude": latitude}
+        location = self.session.scalars(LOCATION_BY_COORDS, params).one_or_none()
         if location is None:
             pop_centre_type = (
                 PopulationCentre(loc_dict["population_centre"])
@@ -294,25 +432,30 @@ class TASImporter:
                 country=loc_dict["country"],
                 timezone=loc_dict["timezone"],
             )
+        self.cache[key] = location
         return location
 
     def observer(self) -> Observer:
         over_dict = self.table.meta["Observer"]
         name = over_dict["name"]
         obs_type = ObserverType(over_dict["type"])
-        q = select(Observer).where(Observer.type == obs_type, Observer.name == name)
-        return self.session.scalars(q).one_or_none() or Observer(
-            type=obs_type,
-            name=name,
-            nickname=over_dict["nickname"],
-            affiliation=over_dict["affiliation"],
-            acronym=over_dict["acronym"],
-            email=over_dict["acronym"],
-            website_url=over_dict["website_url"],
-            valid_since=datetime.strptime(over_dict["valid_since"], "%Y-%m-%dT%H:%M:%S"),
-            valid_until=datetime.strptime(over_dict["valid_until"], "%Y-%m-%dT%H:%M:%S"),
-            valid_state=ValidState(over_dict["valid_state"]),
-        )
+        key = (Observer, obs_type, name)
+        if key not in self.cache:
+            params = {"type": obs_type, "name": name}
+            found = self.session.scalars(OBSERVER_BY_NAME, params).one_or_none()
+            self.cache[key] = found or Observer(
+                type=obs_type,
+                name=name,
+                nickname=over_dict["nickname"],
+                affiliation=over_dict["affiliation"],
+                acronym=over_dict["acronym"],
+                email=over_dict["acronym"],
+                website_url=over_dict["website_url"],
+                valid_since=datetime.strptime(over_dict["valid_since"], "%Y-%m-%dT%H:%M:%S"),
+                valid_until=datetime.strptime(over_dict["valid_until"], "%Y-%m-%dT%H:%M:%S"),
+                valid_state=ValidState(over_dict["valid_state"]),
+            )
+        return self.cache[key]
 
     def measurements(
         self,
@@ -320,32 +463,9 @@ class TASImporter:
         observation: Observation,
         location: Location,
         observer: Observer,
-    ) -> Iterable[Measurement]:
-        measurements = list()
-        for row in self.table:
-            tstamp = datetime.strptime(row["UT_Datetime"], self.tstamp_fmt)
-            measurement = Measurement(
-                date_id=int(tstamp.strftime("%Y%m%d")),
-                time_id=int(tstamp.strftime("%H%M%S")),
-                photometer=photometer,
-                observer=observer,
-                location=location,
-                observation=observation,
-                sequence=int(row["ind"]),
-                azimuth=row["Azi"],
-                altitude=row["Alt"],
-                zenital=90.0 - row["Alt"],
-                magnitude=row["Mag"],
-                frequency=row.get("Hz"),
-                sky_temp=row.get("Temp_IR"),
-                sensor_temp=row.get("T_sens"),
-                longitude=row.get("Long"),
-                latitude=row.get("Lat"),
-                masl=row.get("SL"),
-                bat_volt=row.get("VBat"),
-            )
-            measurements.append(measurement)
-        return measurements
+    ) -> list[dict]:
+        """See measurement_rows()"""
+        return measurement_rows(self.table, photometer, observation, location, observer)
 
 
 class TASExporter:
@@ -359,40 +479,31 @@ class TASExporter:
         observer: Observer,
         measurements: Measurement,
     ) -> Table:
-        data_rows = [
-            (
-                m.sequence,
-                m.local_time(location.timezone).isoformat(),
-                m.utc_time().isoformat(),
-                m.sky_temp * u.deg_C,
-                m.sensor_temp * u.deg_C,
-                m.magnitude,
-                m.frequency * u.Hz,
-                m.altitude * u.deg,
-                m.azimuth * u.deg,
-                m.latitude * u.deg,
-                m.longitude * u.deg,
-                m.masl * u.m,
-                m.bat_volt * u.V if m.bat_volt else None,
-            )
-            for m in measurements
-        ]
-        header = (
-            "ind",
-            "Datetime",
-            "UT_Datetime",
-            "Temp_IR",
-            "T_sens",
-            "Mag",
-            "Hz",
-            "Alt",
-            "Azi",
-            "Lat",
-            "Long",
-            "SL",
-            "VBat",
+        """Measurements may be ORM objects or plain rows with the EXPORTED_COLUMNS"""
+        rows = list(measurements)
+        if rows and isinstance(rows[0], Measurement):
+            rows = [tuple(getattr(m, name) for name in EXPORTED_COLUMNS) for m in rows]
+        # Rows transposed into whole columns at once
+        exported = zip(*rows) if rows else ((),) * len(EXPORTED_COLUMNS)
+        exported = dict(zip(EXPORTED_COLUMNS, exported))
+        local, utc = iso_timestamps(
+            exported["date_id"], exported["time_id"], ZoneInfo(location.timezone)
         )
-        table = Table(rows=data_rows, names=header)
+        columns = {tas_name: exported[name] for name, tas_name in TAS_MEASUREMENT_COLUMNS}
+        columns["Datetime"] = local
+        columns["UT_Datetime"] = utc
+        table = Table()
+        for name, dtype, unit in TAS_SCHEMA:
+            values = columns[name]
+            if name == "VBat" and None in values:
+                # Battery voltage is optional, missing values are masked.
+                # A masked array times a unit would drop the mask, so the unit goes in the column
+                mask = [v is None for v in values]
+                data = [0.0 if v is None else v for v in values]
+                table[name] = MaskedColumn(data, mask=mask, dtype=dtype, unit=unit)
+            else:
+                values = np.array(values, dtype=dtype)
+                table[name] = values * unit if unit is not None else values
         table.meta["Observer"] = observer.to_dict()
         table.meta["Location"] = location.to_dict()
         table.meta["Photometer"] = photometer.to_dict()
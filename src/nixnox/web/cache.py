@@ -0,0 +1,38 @@
+# ----------------------------------------------------------------------
+# Copyright (c) 2024 Rafael Gonzalez.
+#
+# See the LICENSE file for details
+# ----------------------------------------------------------------------
+
+# -------------
+# Local imports
+# -------------
+
+from . import dbase as db
+from .streamlit import ttl, instrumented_cache, connection
+
+# ---------------------------------------------------------
+# Cached getters shared by several pages, so that they also
+# share a single cache instead of one per page
+# ---------------------------------------------------------
+
+
+@instrumented_cache(ttl=ttl(), max_entries=256)
+def get_observation_details(obs_tag: str):
+    with connection().session as session:
+        return db.obs_details(session, obs_tag)
+
+
+# Observation list & counter, an upload makes them stale
+
+
+@instrumented_cache(ttl=ttl(), max_entries=64)
+def obs_summary(conditions):
+    with connection().session as session:
+        return db.obs_summary_search(session, conditions)
+
+
+@instrumented_cache(ttl=ttl(), max_entries=1)
+def obs_nsummaries():
+    with connection().session as session:
+        return db.obs_nsummaries(session)
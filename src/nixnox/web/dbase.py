@@ -14,6 +14,7 @@ from io import StringIO
 # Third party libraries
 # =====================
 
+import numpy as np
 from sqlalchemy import select, func, desc
 from streamlit.logger import get_logger
 
@@ -21,8 +22,6 @@ from streamlit.logger import get_logger
 # Local imports
 # -------------
 
-from ..lib import PhotometerModel
-
 from ..lib.dbase.model import (
     Photometer,
     Observer,
@@ -31,7 +30,7 @@ from ..lib.dbase.model import (
     Measurement,
 )
 
-from ..lib.ecsv.tas import TASExporter
+from ..lib.ecsv import recall_observation
 
 # ----------------
 # Global variables
@@ -39,6 +38,22 @@ from ..lib.ecsv.tas import TASExporter
 
 log = get_logger(__name__)
 
+# Measurement columns displayed in the web pages, same order as Measurement.to_dict()
+MEASUREMENT_COLUMNS = (
+    "sequence",
+    "azimuth",
+    "altitude",
+    "zenital",
+    "magnitude",
+    "frequency",
+    "sensor_temp",
+    "sky_temp",
+    "longitude",
+    "latitude",
+    "masl",
+    "bat_volt",
+)
+
 
 def obs_nsummaries(session) -> int:
     q = select(func.count("*")).select_from(Observation)
@@ -57,7 +72,7 @@ def obs_summary_search(session, cond: dict = None):
         )
         .select_from(Measurement)
         .join(Observation, Measurement.obs_id == Observation.obs_id)
-        .join(Location, Measurement.observer_id == Location.location_id)
+        .join(Location, Measurement.location_id == Location.location_id)
         .join(Observer, Measurement.observer_id == Observer.observer_id)
         .join(Photometer, Measurement.phot_id == Photometer.phot_id)
     )
@@ -126,44 +141,53 @@ def obs_summary_search(session, cond: dict = None):
 
 
 def obs_details(session, obs_tag: str):
+    """All four entities in a single round trip.
+    Any measurement of the observation will do, so stop at the first one"""
     q = (
         select(Observation, Observer, Location, Photometer)
         .select_from(Measurement)
         .join(Observation, Measurement.obs_id == Observation.obs_id)
-        .join(Location, Measurement.observer_id == Location.location_id)
+        .join(Location, Measurement.location_id == Location.location_id)
         .join(Observer, Measurement.observer_id == Observer.observer_id)
         .join(Photometer, Measurement.phot_id == Photometer.phot_id)
         .where(Observation.identifier == obs_tag)
-        .group_by(Measurement.obs_id)
+        .limit(1)
     )
     return session.execute(q).one()
 
 
-def obs_measurements(session, obs_tag: str):
+def obs_measurement_rows(session, obs_tag: str, columns: tuple = MEASUREMENT_COLUMNS) -> list:
+    """Plain column tuples, without the cost of building Measurement ORM objects"""
     q = (
-        select(Measurement)
+        select(*(getattr(Measurement, name) for name in columns))
+        .select_from(Measurement)
+        .join(Observation, Measurement.obs_id == Observation.obs_id)
+        .where(Observation.identifier == obs_tag)
+    )
+    return session.execute(q).all()
+
+
+def obs_measurement_columns(
+    session, obs_tag: str, columns: tuple = ("azimuth", "zenital", "magnitude")
+) -> dict[str, np.ndarray]:
+    """Fetch only the selected Measurement columns as contiguous float32 arrays"""
+    q = (
+        select(*(getattr(Measurement, name) for name in columns))
         .select_from(Measurement)
         .join(Observation, Measurement.obs_id == Observation.obs_id)
-        .join(Location, Measurement.observer_id == Location.location_id)
-        .join(Observer, Measurement.observer_id == Observer.observer_id)
-        .join(Photometer, Measurement.phot_id == Photometer.phot_id)
         .where(Observation.identifier == obs_tag)
     )
-    return session.scalars(q).all()
+    rows = session.execute(q).all()
+    data = np.array(rows, dtype=np.float32).reshape(len(rows), len(columns)).T.copy()
+    return dict(zip(columns, data))
 
 
-def obs_export(session, obs_tag: str) -> str:
-    """Outputs a ECSV formatted string suitable to be sent to a web browser"""
+def obs_export(session, obs_tag: str) -> bytes:
+    """Outputs ECSV formatted bytes suitable to be sent to a web browser"""
     q = select(Observation).where(Observation.identifier == obs_tag)
     observation = session.scalars(q).one_or_none()
-    measurements = observation.measurements
-    location = measurements[0].location
-    observer = measurements[0].observer
-    photometer = measurements[0].photometer
-    if photometer.model == PhotometerModel.TAS:
-        table = TASExporter().to_table(photometer, observation, location, observer, measurements)
-    else:
-        raise NotImplementedError
+    table = recall_observation(session, observation)
     output_file = StringIO()
     table.write(output_file, delimiter=",", format="ascii.ecsv", overwrite=True)
-    return output_file.getvalue()
+    # Encode once here so that the cached bytes are handed out as is
+    return output_file.getvalue().encode("utf-8")
@@ -11,6 +11,7 @@
 
 from enum import Enum
 from typing import Tuple
+from threading import RLock
 
 # =====================
 # Third party libraries
@@ -24,11 +25,12 @@ from astropy import units as u
 
 from scipy.interpolate import griddata
 
-import matplotlib.pyplot as plt
+# Object oriented API only, pyplot global state is not thread safe
+from matplotlib import colormaps
 import matplotlib.colors as mcolors
+from matplotlib.figure import Figure
 
 # Type annotations
-from matplotlib.figure import Figure
 from matplotlib.axes import Axes
 from matplotlib.colors import LinearSegmentedColormap
 
@@ -42,6 +44,13 @@ from ..lib.dbase.model import observer_name
 
 log = get_logger(__name__)
 
+# According to the streamlit documentation:
+# """Matplotlib doesn't work well with threads.
+#    So if you're using Matplotlib you should wrap your code with locks."""
+# It lives here because Streamlit runs the page scripts as a fresh __main__ on every
+# rerun, a lock created there would be a new one each time and serialize nothing.
+render_lock = RLock()
+
 
 class Magnitude(float, Enum):
     SUPER_BRIGHT = 8.0
@@ -99,8 +108,8 @@ def interpolate(
 def colormap() -> LinearSegmentedColormap:
     """make a 256 point combined colormap from reversed viridis and YlOrRd"""
     NC1 = 192
-    colors2 = plt.cm.viridis_r(np.linspace(0, 1, NC1))
-    colors1 = plt.cm.YlOrRd_r(np.linspace(0, 1, 256 - NC1))
+    colors2 = colormaps["viridis_r"](np.linspace(0, 1, NC1))
+    colors1 = colormaps["YlOrRd_r"](np.linspace(0, 1, 256 - NC1))
     colors = np.vstack((colors1, colors2))
     return mcolors.LinearSegmentedColormap.from_list("my_colormap", colors)
 
@@ -132,7 +141,8 @@ def plot_non_interpolated(
     max_mag: float,
     nticks: int,
 ) -> Figure:
-    fig, ax = plt.subplots(subplot_kw={"projection": "polar"}, figsize=(9, 10))
+    fig = Figure(figsize=(9, 10))
+    ax = fig.subplots(subplot_kw={"projection": "polar"})
     ax.set_theta_zero_location(Azimuth.N.name)  # Set the north to the north
     ax.set_theta_direction(-1)
     ax.set_xticks(np.deg2rad([e.value for e in Azimuth]))
@@ -170,7 +180,8 @@ def plot_interpolated(
     dark_mag: float = Magnitude.BRIGHT,  # Threshold magnitude for brightness cmap steps
     thres_mag: float = Magnitude.MEDIUM_DARK,  # Threshold magnitude for brightness cmap steps
 ) -> Figure:
-    fig, ax = plt.subplots(subplot_kw={"projection": "polar"}, figsize=(9, 12))
+    fig = Figure(figsize=(9, 12))
+    ax = fig.subplots(subplot_kw={"projection": "polar"})
     ax.set_theta_zero_location(Azimuth.N.name)  # Set the north to the north
     ax.set_theta_direction(-1)
     ax.set_xticks(np.deg2rad([e.value for e in Azimuth]))
@@ -324,11 +335,12 @@ def plot_alex(
     brightness = np.where(np.isnan(interp_cubic), interp_nearest, interp_cubic)
 
     # === GRAFICAR ===
-    fig, ax = plt.subplots(subplot_kw={"projection": "polar"}, figsize=(8, 8))
+    fig = Figure(figsize=(8, 8))
+    ax = fig.subplots(subplot_kw={"projection": "polar"})
     ax.set_theta_zero_location("E")
     ax.set_theta_direction(-1)
 
-    cmap = plt.get_cmap("viridis_r")
+    cmap = colormaps["viridis_r"]
     norm = mcolors.Normalize(vmin=17, vmax=22.2)
     contourf = ax.contourf(theta_grid, r_grid, brightness, 100, cmap=cmap, norm=norm)
     contour_lines = ax.contour(
@@ -349,7 +361,7 @@ def plot_alex(
 
     ax.set_title(tag, fontsize=14, pad=20)
     cbar_ax = fig.add_axes([0.2, 0.03, 0.6, 0.025])
-    cbar = plt.colorbar(
+    cbar = fig.colorbar(
         contourf, cax=cbar_ax, orientation="horizontal", ticks=np.arange(17, 22.5, 0.5)
     )
     cbar.set_label("Sky Brightness [mag/arcsec²]", fontsize=10)
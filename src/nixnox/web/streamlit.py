@@ -1,7 +1,66 @@
 import os
+import time
+import functools
+import threading
+
 import streamlit as st
 
+# Per thread stack of "cache miss" flags, one per nested cached call in progress
+_local = threading.local()
+
+
+def env() -> str:
+	"""get the development environment"""
+	return os.environ.get("NX_ENV", "prod")
+
+
 def ttl() -> str:
 	"""get the Cache Time to live as a function of the development environment"""
-	env = os.environ.get("NX_ENV", "prod")
-	return st.secrets["cache"][env]["ttl"]
+	return st.secrets["cache"][env()]["ttl"]
+
+
+def connection():
+	"""The SQL connection. Streamlit keeps it as a cached resource, so this is cheap.
+	Cached getters call it only on a cache miss instead of taking it as an argument."""
+	return st.connection("env:NX_ENV", type="sql")
+
+
+def instrumented_cache(**kwargs):
+	"""st.cache_data replacement that also records hits, misses and wall time (ms)
+	in st.session_state["_cache_stats"]. The inner function only runs on a miss."""
+
+	def decorator(func):
+		@functools.wraps(func)
+		def inner(*args, **kw):
+			_local.stack[-1] = True
+			return func(*args, **kw)
+
+		cached = st.cache_data(**kwargs)(inner)
+
+		@functools.wraps(func)
+		def outer(*args, **kw):
+			if not hasattr(_local, "stack"):
+				_local.stack = list()
+			_local.stack.append(False)
+			t0 = time.perf_counter()
+			try:
+				return cached(*args, **kw)
+			finally:
+				elapsed = (time.perf_counter() - t0) * 1000
+				missed = _local.stack.pop()
+				all_stats = st.session_state.setdefault("_cache_stats", dict())
+				stats = all_stats.setdefault(func.__name__, {"hits": 0, "misses": 0, "t_ms": 0.0})
+				stats["misses" if missed else "hits"] += 1
+				stats["t_ms"] += elapsed
+
+		outer.clear = cached.clear
+		return outer
+
+	return decorator
+
+
+def cache_stats() -> None:
+	"""Display the cache statistics in the sidebar (development environment only)"""
+	if env() == "dev":
+		with st.sidebar.expander("Cache statistics"):
+			st.json(st.session_state.get("_cache_stats", dict()))
@@ -0,0 +1,10 @@
+# ----------------------------------------------------------------------
+# Copyright (c) 2024 Rafael Gonzalez.
+#
+# See the LICENSE file for details
+# ----------------------------------------------------------------------
+
+import os
+
+# lica.sqlalchemy.dbase builds its engine at import time
+os.environ.setdefault("DATABASE_URL", "sqlite://")
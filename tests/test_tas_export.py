@@ -0,0 +1,112 @@
+# ----------------------------------------------------------------------
+# Copyright (c) 2024 Rafael Gonzalez.
+#
+# See the LICENSE file for details
+# ----------------------------------------------------------------------
+
+import io
+from datetime import datetime
+
+from nixnox.lib import (
+    ObserverType,
+    ValidState,
+    PhotometerModel,
+    Temperature,
+    Humidity,
+    Coordinates,
+    Timestamp,
+)
+from nixnox.lib.dbase.model import Photometer, Observer, Observation, Location, Sensor
+from nixnox.lib.ecsv import read_ecsv
+from nixnox.lib.ecsv.tas import TASExporter, EXPORTED_COLUMNS
+
+
+def parents():
+    photometer = Photometer(
+        model=PhotometerModel.TAS,
+        name="TAS1",
+        sensor=Sensor.TSL237,
+        fov=17.0,
+        zero_point=20.5,
+        comment=None,
+    )
+    observation = Observation(
+        identifier="TEST_OBS",
+        digest="0123456789abcdef0123456789abcdef",
+        temperature_1=10.0,
+        temperature_2=None,
+        temperature_meas=Temperature.MEDIAN,
+        humidity_1=None,
+        humidity_2=None,
+        humidity_meas=Humidity.UNKNOWN,
+        timestamp_1=datetime(2024, 10, 23, 22, 49, 1),
+        timestamp_2=None,
+        timestamp_meas=Timestamp.MIDTERM,
+        weather_conditions=None,
+        comment=None,
+        other_observers=None,
+        image_url=None,
+    )
+    location = Location(
+        longitude=-3.7,
+        latitude=40.4,
+        masl=650.0,
+        coords_meas=Coordinates.MEDIAN,
+        place="UCM",
+        population_centre="Madrid",
+        population_centre_type=None,
+        sub_region="Madrid",
+        region="Comunidad de Madrid",
+        country="Spain",
+        timezone="Europe/Madrid",
+    )
+    observer = Observer(
+        type=ObserverType.PERSON,
+        name="Jaime",
+        nickname=None,
+        affiliation="UCM",
+        acronym=None,
+        website_url=None,
+        email=None,
+        valid_since=datetime(2024, 1, 1),
+        valid_until=datetime(2999, 12, 31),
+        valid_state=ValidState.CURRENT,
+    )
+    return photometer, observation, location, observer
+
+
+def row(seq: int, bat_volt: float | None) -> tuple:
+    values = dict(
+        date_id=20241023,
+        time_id=224900 + seq,
+        sequence=seq,
+        sky_temp=-5.0,
+        sensor_temp=12.0,
+        magnitude=20.0,
+        frequency=10.0,
+        altitude=45.0,
+        azimuth=10.0 * seq,
+        latitude=40.4,
+        longitude=-3.7,
+        masl=650.0,
+        bat_volt=bat_volt,
+    )
+    return tuple(values[name] for name in EXPORTED_COLUMNS)
+
+
+def test_missing_vbat_stays_missing():
+    rows = [row(0, None), row(1, 3.9), row(2, None)]
+    table = TASExporter().to_table(*parents(), rows)
+    assert table["VBat"].mask.tolist() == [True, False, True]
+    assert str(table["VBat"].unit) == "V"
+    output = io.StringIO()
+    table.write(output, delimiter=",", format="ascii.ecsv")
+    reread = read_ecsv(io.BytesIO(output.getvalue().encode("utf-8")))
+    assert reread["VBat"].tolist() == [None, 3.9, None]
+
+
+def test_all_vbat_present():
+    rows = [row(0, 3.8), row(1, 3.9)]
+    table = TASExporter().to_table(*parents(), rows)
+    assert table["VBat"].tolist() == [3.8, 3.9]
+    assert str(table["VBat"].unit) == "V"
@@ -10,6 +10,8 @@ import os
 
 import streamlit as st
 
+from nixnox.web.streamlit import cache_stats
+
 # ==========================
 # WEB APPPLICATION STRUCTURE
 # ==========================
@@ -39,3 +41,4 @@ pg = st.navigation(
     ]
 )
 pg.run()
+cache_stats()